@@ -1,20 +1,23 @@
 # app.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
-from datetime import datetime, time
+import threading
+import time
 import streamlit_authenticator as stauth
 
 # Import from project modules
 from data_handler import (
-    load_data, log_trade, admin_delete_trade, process_and_save_csv, 
+    DATABASE_FILE, load_data, get_shares_held, log_trade, delete_trade, bulk_delete_trades, process_and_save_csv, 
     admin_update_trade_timestamp
 )
 from auth_handler import (
     get_all_users, add_user, get_user_by_username, delete_user,
-    update_user_password, check_password
+    update_user_password, check_password, get_cookie_config
 )
-from portfolio import calculate_portfolio
+from portfolio import INITIAL_CAPITAL, calculate_portfolio
+from utils import get_current_price, validate_ticker
 from display import display_portfolio, display_leaderboard
 
 # --- Page Configuration ---
@@ -24,36 +27,117 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# --- Load Dynamic Credentials from Database ---
-credentials_dict = {"usernames": {}}
-try:
-    db_users = get_all_users()
-    if db_users:
-        for user in db_users:
-            if all(k in user for k in ['username', 'name', 'email', 'hashed_password']):
-                credentials_dict["usernames"][user['username']] = {
-                    "email": user['email'],
-                    "name": user['name'],
-                    "password": user['hashed_password']
-                }
-except Exception as e:
-    st.error(f"Critical Error: Failed to load user credentials from database: {e}")
-    credentials_dict = {"usernames": {}}
+# --- Cached User Lookups (cleared after register/delete/password changes) ---
+@st.cache_data(ttl=600, show_spinner=False)
+def _load_credentials():
+    """Builds the streamlit-authenticator credentials dict from the users table in one pass."""
+    # get_all_users always selects these columns, so no per-record key checks are needed
+    return {"usernames": {
+        user['username']: {"email": user['email'], "name": user['name'], "password": user['hashed_password']}
+        for user in get_all_users()
+    }}
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _cached_user(username):
+    """Cached wrapper around get_user_by_username (returns a plain dict or None)."""
+    return get_user_by_username(username)
+
+ADMIN_USER_COLUMNS = ['user_id', 'username', 'name', 'email', 'registration_date', 'is_admin']
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _admin_users_df(version: int):
+    """Display-ready users table for the Admin Panel, rebuilt only when the users version changes."""
+    rows = get_all_users()
+    users_df = pd.DataFrame(rows, columns=rows[0].keys())[ADMIN_USER_COLUMNS] if rows else pd.DataFrame(columns=ADMIN_USER_COLUMNS)
+    users_df['is_admin'] = np.where(users_df['is_admin'].to_numpy() == 1, 'Yes', 'No')
+    return users_df.rename(columns={'is_admin': 'Admin?'})
+
+@st.cache_resource
+def _users_generation():
+    """Process-wide counter bumped whenever the users table changes."""
+    return {"value": 0}
+
+def _invalidate_user_caches():
+    _users_generation()["value"] += 1
+    _load_credentials.clear()
+    _cached_user.clear()
+    _admin_users_df.clear()
+
+# --- Cached Trades Loading (keyed on the database and WAL file mtimes) ---
+@st.cache_data(show_spinner=False, max_entries=1)  # Only the current database state is worth keeping
+def _cached_load(db_stamp: tuple):
+    """Loads the trades table once per database modification instead of on every rerun. A failed read raises and is not cached."""
+    return load_data()
+
+def _load_trades():
+    # In WAL mode commits land in the -wal file first, so its mtime is part of the key too
+    db_stamp = tuple(os.stat(f).st_mtime_ns if os.path.exists(f) else 0 for f in (DATABASE_FILE, DATABASE_FILE + "-wal"))
+    return _cached_load(db_stamp)
+
+# --- Cached Portfolio Calculation (keyed on the trades version counter) ---
+# cache_resource: one shared, read-only result for every session instead of a copy per caller
+@st.cache_resource(ttl=300, max_entries=2, show_spinner=False)  # Same TTL as the live prices it embeds
+def _cached_portfolio(version: int):
+    """Calculates all portfolios once per trades version instead of on every rerun. Treat the result as read-only."""
+    trades = _load_trades()
+    if trades.empty:
+        return {}
+    # One batched quote request for every traded ticker, shared with the calculation below
+    price_map = get_current_price(sorted(trades['ticker'].dropna().unique().tolist())) or {}
+    return calculate_portfolio(trades, price_map)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _participants_with_trades(version: int):
+    """Set of participants that have at least one trade, for O(1) membership checks."""
+    trades = _load_trades()
+    if trades.empty:
+        return set()
+    return set(trades['participant'].dropna().unique().tolist())
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _ticker_options(version: int):
+    """Sorted unique tickers for the trade form, rebuilt only when the trades version changes."""
+    trades = _load_trades()
+    if trades.empty:
+        return []
+    return np.sort(trades['ticker'].dropna().astype('string').unique()).tolist()
+
+@st.cache_resource
+def _trades_generation():
+    """Process-wide counter bumped whenever the trades table changes."""
+    return {"value": 0}
+
+@st.cache_resource
+def _trades_write_lock():
+    """Process-wide lock so a trade's position check, write and version bump aren't interleaved across sessions."""
+    return threading.RLock()
+
+def _bump_trades_version():
+    with _trades_write_lock():
+        _trades_generation()["value"] += 1
+
+# --- Load Dynamic Credentials from Database (once per session, until the users change) ---
+users_generation = _users_generation()["value"]
+if st.session_state.get("_credentials_generation") != users_generation:
+    try:
+        st.session_state["_credentials"] = _load_credentials()
+        st.session_state["_credentials_generation"] = users_generation
+    except Exception as e:
+        st.error(f"Critical Error: Failed to load user credentials from database: {e}")
+        st.session_state["_credentials"] = {"usernames": {}}
+credentials_dict = st.session_state["_credentials"]
 
 # --- Initialize Authenticator ---
 authenticator = None
 try:
-    if 'RAILWAY_ENVIRONMENT' in os.environ:
-        cookie_name = os.environ.get("COOKIE_NAME")
-        cookie_key = os.environ.get("COOKIE_KEY")
-        cookie_expiry = int(os.environ.get("COOKIE_EXPIRY_DAYS", "30"))
-    else:
+    if 'RAILWAY_ENVIRONMENT' not in os.environ:
         st.warning("Running in local mode. Using default cookie settings.")
-        cookie_name = "pennystockcookie_local"
-        cookie_key = "a_default_secret_key_for_local_dev"
-        cookie_expiry = 30
+    cookie_name, cookie_key, cookie_expiry = get_cookie_config()
 
-    authenticator = stauth.Authenticate(credentials_dict, cookie_name, cookie_key, cookie_expiry)
+    # Built on every rerun on purpose: the constructor renders the per-browser cookie
+    # component and seeds session state, so it can't be shared via st.cache_resource.
+    # Passwords in the users table are always bcrypt hashes, so skip the auto-hash scan.
+    authenticator = stauth.Authenticate(credentials_dict, cookie_name, cookie_key, cookie_expiry, auto_hash=False)
 except Exception as e:
     st.error(f"Error initializing authenticator: {e}")
     st.stop()
@@ -63,11 +147,12 @@ if st.session_state.get("authentication_status"):
     name = st.session_state.get("name")
     username = st.session_state.get("username")
 
-    current_user_data = get_user_by_username(username)
-    if current_user_data:
-        st.session_state.is_admin = (current_user_data.get('is_admin', 0) == 1)
-    else:
-        st.session_state.is_admin = False
+    # Admin status is looked up once per login and re-checked only when the users table changes
+    admin_token = (username, _users_generation()["value"])
+    if st.session_state.get("_is_admin_for") != admin_token:
+        current_user_data = _cached_user(username)
+        st.session_state.is_admin = bool(current_user_data) and current_user_data.get('is_admin', 0) == 1
+        st.session_state["_is_admin_for"] = admin_token
 
     # --- Sidebar ---
     st.sidebar.write(f'Welcome *{name}* ({username})')
@@ -75,67 +160,121 @@ if st.session_state.get("authentication_status"):
     authenticator.logout('Logout', 'sidebar', key='logout_button')
     st.sidebar.divider()
 
-    with st.sidebar.expander("🔑 Change My Password"):
-        with st.form("change_password_form", clear_on_submit=True):
-            current_password = st.text_input("Current Password", type="password")
-            new_password = st.text_input("New Password", type="password")
-            confirm_new_password = st.text_input("Confirm New Password", type="password")
-            if st.form_submit_button("Change Password"):
-                if not all([current_password, new_password, confirm_new_password]):
-                    st.warning("Please fill all password fields.")
-                elif new_password != confirm_new_password:
-                    st.error("New passwords do not match.")
-                else:
-                    user_data = get_user_by_username(username)
-                    if user_data and check_password(current_password, user_data['hashed_password']):
-                        if update_user_password(username, new_password):
-                            st.success("Password updated successfully!")
-                        else: st.error("Failed to update password.")
-                    else: st.error("Current password is not correct.")
-    st.sidebar.divider()
+    # Account forms in a fragment: submitting one reruns only these expanders, not the whole page
+    @st.fragment
+    def _account_forms():
+        with st.expander("🔑 Change My Password"):
+            with st.form("change_password_form", clear_on_submit=True):
+                current_password = st.text_input("Current Password", type="password")
+                new_password = st.text_input("New Password", type="password")
+                confirm_new_password = st.text_input("Confirm New Password", type="password")
+                if st.form_submit_button("Change Password"):
+                    if not all([current_password, new_password, confirm_new_password]):
+                        st.warning("Please fill all password fields.")
+                    elif new_password != confirm_new_password:
+                        st.error("New passwords do not match.")
+                    else:
+                        user_data = _cached_user(username)
+                        if user_data and check_password(current_password, user_data['hashed_password_bytes']):
+                            if update_user_password(username, new_password):
+                                _invalidate_user_caches()
+                                st.success("Password updated successfully!")
+                            else: st.error("Failed to update password.")
+                        else: st.error("Current password is not correct.")
+        st.divider()
 
-    with st.sidebar.expander("⬆️ Import Trades from CSV"):
-        with st.form("csv_upload_form"):
-            uploaded_file = st.file_uploader("Choose a CSV file", type="csv", help="CSV must have columns: timestamp, ticker, action, shares, price")
-            if st.form_submit_button("Import Trades"):
-                if uploaded_file is not None:
-                    with st.spinner("Processing file..."):
-                        success, message = process_and_save_csv(uploaded_file, username)
-                        if success:
-                            st.success(message)
-                            st.cache_data.clear()
-                            st.rerun()
-                        else: st.error(message)
-                else: st.warning("Please upload a file before importing.")
-    st.sidebar.divider()
+        with st.expander("⬆️ Import Trades from CSV"):
+            with st.form("csv_upload_form"):
+                uploaded_file = st.file_uploader("Choose a CSV file", type="csv", help="CSV must have columns: timestamp, ticker, action, shares, price")
+                if st.form_submit_button("Import Trades"):
+                    if uploaded_file is not None:
+                        with st.spinner("Processing file..."):
+                            success, message = process_and_save_csv(uploaded_file, username)
+                            if success:
+                                st.success(message)
+                                _bump_trades_version()
+                                st.rerun()
+                            else: st.error(message)
+                    else: st.warning("Please upload a file before importing.")
+        st.divider()
+
+    with st.sidebar:
+        _account_forms()
 
     st.sidebar.header(f"Enter New Trade")
-    trades = load_data()
-    portfolios = calculate_portfolio(trades.copy())
-    existing_tickers = sorted([str(t) for t in trades['ticker'].dropna().unique()]) if not trades.empty else []
+    trades_version = _trades_generation()["value"]
+    try:
+        portfolios = _cached_portfolio(trades_version)
+        existing_tickers = _ticker_options(trades_version)
+    except Exception as e:
+        # Nothing was cached for this failure, so the next rerun reads the database again
+        st.error(f"Could not load trades from the database: {e}. Please try again.")
+        st.stop()
 
-    with st.sidebar.form("new_trade_form", clear_on_submit=True):
-        ticker_options = ["-- Enter New Ticker --"] + existing_tickers
-        selected_ticker_option = st.selectbox("Ticker Symbol:", ticker_options)
-        new_ticker_input = ""
-        if selected_ticker_option == "-- Enter New Ticker --":
-            new_ticker_input = st.text_input("Enter New Ticker Symbol:", placeholder="e.g., GME").upper().strip()
-        action = st.selectbox("Action:", ["Buy", "Sell"])
-        shares = st.number_input("Number of Shares:", min_value=1, step=1)
-        price = st.number_input("Price per Share:", min_value=0.001, step=0.001, format="%.3f")
-        
-        if st.form_submit_button("Record Trade", type="primary"):
-            ticker_to_use = new_ticker_input if selected_ticker_option == "-- Enter New Ticker --" else selected_ticker_option
-            if ticker_to_use:
-                # --- FIX for Bug #1: Use the new log_trade function ---
-                if log_trade(username, ticker_to_use, action, shares, price):
-                    st.sidebar.success(f"Trade recorded!")
-                    st.cache_data.clear()
-                    st.rerun()
-                else:
-                    st.sidebar.error("Failed to record trade.")
+    NEW_TICKER_OPTION = "-- Enter New Ticker --"
+    DUPLICATE_TRADE_WINDOW_SECONDS = 10  # An identical submission this soon after the last one is treated as a double-click
+
+    def _ticker_is_known(ticker):
+        """validate_ticker's answer, or None if the lookup itself failed (uncached, so the next submit retries)."""
+        try:
+            return validate_ticker(ticker)
+        except Exception as e:
+            print(f"Ticker lookup failed for {ticker}: {e}")
+            return None
+
+    def _submit_trade():
+        # Runs once per click before the script reruns, so the bumped trades version is picked up without st.rerun()
+        ss = st.session_state
+        version = _trades_generation()["value"]
+        selected_ticker_option = ss.get("trade_ticker_option")
+        if selected_ticker_option == NEW_TICKER_OPTION:
+            ticker_to_use = (ss.get("trade_new_ticker") or "").upper().strip()
+        else:
+            ticker_to_use = selected_ticker_option
+        action, shares, price = ss.get("trade_action"), ss.get("trade_shares"), ss.get("trade_price")
+        trade_signature = (username, ticker_to_use, action, shares, price)
+        last_signature, last_time = ss.get("_last_trade", (None, 0.0))
+        if not ticker_to_use:
+            ss["trade_result"] = ("error", "Please select or enter a ticker.")
+            return
+        if trade_signature == last_signature and time.monotonic() - last_time < DUPLICATE_TRADE_WINDOW_SECONDS:
+            ss["trade_result"] = ("warning", "Identical trade was just recorded; duplicate submission ignored.")
+            return
+        # The Yahoo lookup runs before taking the write lock, so other sessions' writes never wait on it
+        if ticker_to_use not in _ticker_options(version) and (known := _ticker_is_known(ticker_to_use)) is not True:
+            if known is None:
+                ss["trade_result"] = ("warning", f"Couldn't verify '{ticker_to_use}' right now; please try again.")
+            else:
+                ss["trade_result"] = ("error", f"'{ticker_to_use}' is not a recognised ticker symbol.")
+            return
+
+        # Only the indexed position check, the insert and the version bump are serialized
+        with _trades_write_lock():
+            shares_owned = get_shares_held(username, ticker_to_use) if action == "Sell" else 0
+            if action == "Sell" and shares > shares_owned:
+                ss["trade_result"] = ("error", f"Cannot sell {shares:,} shares of {ticker_to_use}; you own {shares_owned:,.0f}.")
+            # --- FIX for Bug #1: Use the new log_trade function ---
+            elif log_trade(username, ticker_to_use, action, shares, price):
+                ss["trade_result"] = ("success", "Trade recorded!")
+                ss["_last_trade"] = (trade_signature, time.monotonic())
+                _bump_trades_version()
             else:
-                st.sidebar.error("Please select or enter a ticker.")
+                ss["trade_result"] = ("error", "Failed to record trade.")
+
+    with st.sidebar.form("new_trade_form", clear_on_submit=True):
+        ticker_options = [NEW_TICKER_OPTION] + existing_tickers
+        selected_ticker_option = st.selectbox("Ticker Symbol:", ticker_options, key="trade_ticker_option")
+        if selected_ticker_option == NEW_TICKER_OPTION:
+            st.text_input("Enter New Ticker Symbol:", placeholder="e.g., GME", key="trade_new_ticker")
+        st.selectbox("Action:", ["Buy", "Sell"], key="trade_action")
+        st.number_input("Number of Shares:", min_value=1, step=1, key="trade_shares")
+        st.number_input("Price per Share:", min_value=0.001, step=0.001, format="%.3f", key="trade_price")
+        st.form_submit_button("Record Trade", type="primary", on_click=_submit_trade)
+
+    trade_result = st.session_state.pop("trade_result", None)
+    if trade_result:
+        kind, message = trade_result
+        getattr(st.sidebar, kind)(message)
 
     # --- Main Page Content ---
     st.title(f"📈 Penny Stock Trading Competition")
@@ -149,19 +288,114 @@ if st.session_state.get("authentication_status"):
     with col2:
         if st.button("🔄 Refresh Live Prices", use_container_width=True):
             st.cache_data.clear()
+            _cached_portfolio.clear()
             st.toast("Prices and portfolios refreshed!", icon="✅")
     st.markdown("---")
 
-    if view_option == "My Dashboard":
+    @st.dialog("Confirm user deletion")
+    def _confirm_delete_user(user_to_delete):
+        st.write(f"Permanently delete user '{user_to_delete}'? Their trades are kept.")
+        col_yes, col_no = st.columns(2)
+        if col_yes.button("Yes, delete", type="primary", use_container_width=True):
+            if delete_user(user_to_delete):
+                _invalidate_user_caches()
+                st.rerun()
+            else: st.error(f"Failed to delete '{user_to_delete}'.")
+        if col_no.button("Cancel", use_container_width=True):
+            st.rerun()
+
+    # --- Views (fragments: widget interactions inside a view rerun only that view) ---
+    @st.fragment
+    def _dashboard_view(portfolios):
+        def _delete_own_trade(trade_id):
+            if delete_trade(trade_id, username):
+                st.success(f"Trade ID {trade_id} deleted.")
+                _bump_trades_version()
+                st.rerun()
+            else: st.error(f"Failed to delete trade ID {trade_id}.")
+
         participant_data = portfolios.get(username)
         if participant_data:
-            display_portfolio(participant_data)
+            display_portfolio(participant_data, on_delete_trade=_delete_own_trade, trades_version=_trades_generation()["value"])
+        elif username in _participants_with_trades(_trades_generation()["value"]):
+            st.warning("Your trades were found, but your portfolio could not be calculated. Try refreshing live prices.")
         else:
             st.info("👋 Welcome! Enter your first trade to get started.")
-    elif view_option == "Leaderboard":
-        leaderboard_table_data = [{'Participant': p_data.get('participant', p_name), 'Performance (%)': ((p_data.get('total_value', 500) - 500) / 500) * 100, 'Total Value ($)': p_data.get('total_value', 500)} for p_name, p_data in portfolios.items()]
-        display_leaderboard(leaderboard_table_data, portfolios)
-    elif view_option == "Admin Panel":
+
+    @st.fragment
+    def _leaderboard_view(portfolios):
+        valid_portfolios_for_leaderboard = {
+            p_name: p_data for p_name, p_data in portfolios.items()
+            if isinstance(p_name, str) and isinstance(p_data, dict) and 'total_value' in p_data
+        }
+        values = np.fromiter(
+            (v.get('total_value', INITIAL_CAPITAL) if isinstance(v.get('total_value'), (int, float)) else INITIAL_CAPITAL for v in valid_portfolios_for_leaderboard.values()),
+            dtype=np.float64, count=len(valid_portfolios_for_leaderboard)
+        )
+        names = [p_data.get('participant', p_name) for p_name, p_data in valid_portfolios_for_leaderboard.items()]
+        leaderboard_df = pd.DataFrame({'Participant': names, 'Performance (%)': (values - INITIAL_CAPITAL) / INITIAL_CAPITAL * 100, 'Total Value ($)': values})
+        # Sorted once here; the leaderboard display relies on this order
+        leaderboard_df = leaderboard_df.sort_values('Performance (%)', ascending=False, ignore_index=True, kind='mergesort')
+        display_leaderboard(leaderboard_df, portfolios)
+
+    # Nested fragment: ticking rows in the editor reruns only the trade table, not the whole Admin Panel
+    @st.fragment
+    def _admin_trades_editor():
+        # The full trades table is only needed here, so it is loaded only when this view renders
+        try:
+            trades = _load_trades()
+        except Exception as e:
+            st.error(f"Could not load trades from the database: {e}")
+            return
+        if not trades.empty:
+            st.info(f"Displaying all {len(trades)} trades in the system. Edit a timestamp or tick 'Delete?', then apply below.")
+            # --- FIX for Bug #3: Sort by 'id' descending ---
+            trades_view = trades.sort_values(by='id', ascending=False, kind='mergesort')[
+                ['id', 'participant', 'timestamp', 'ticker', 'action', 'shares', 'price']
+            ].assign(delete=False)
+
+            edited = st.data_editor(
+                trades_view, key="admin_trades_editor", hide_index=True, use_container_width=True,
+                disabled=['id', 'participant', 'ticker', 'action', 'shares', 'price'],
+                column_config={
+                    'id': 'ID',
+                    'participant': 'Participant',
+                    'timestamp': st.column_config.DatetimeColumn('Timestamp', format='YYYY-MM-DD HH:mm:ss'),
+                    'ticker': 'Ticker',
+                    'action': 'Action',
+                    'shares': st.column_config.NumberColumn('Shares', format='%d'),
+                    'price': st.column_config.NumberColumn('Price', format='$%.3f'),
+                    'delete': st.column_config.CheckboxColumn('Delete?'),
+                },
+            )
+
+            ts_changed = edited['timestamp'].notna() & (
+                trades_view['timestamp'].isna() | edited['timestamp'].ne(trades_view['timestamp'])
+            )
+            timestamp_updates = edited.loc[ts_changed, ['id', 'timestamp']]
+            ids_to_delete = edited.loc[edited['delete'], 'id'].tolist()
+
+            col_save, col_delete = st.columns(2)
+            if col_save.button(f"💾 Save {len(timestamp_updates)} timestamp change(s)", disabled=timestamp_updates.empty, use_container_width=True):
+                failed = [int(trade_id) for trade_id, new_ts in timestamp_updates.itertuples(index=False, name=None)
+                          if not admin_update_trade_timestamp(int(trade_id), new_ts.to_pydatetime())]
+                if failed: st.error(f"Failed to update timestamp for trade ID(s): {', '.join(map(str, failed))}.")
+                else: st.success(f"Updated {len(timestamp_updates)} timestamp(s).")
+                _bump_trades_version()
+                if not failed: st.rerun()
+            if col_delete.button(f"🗑️ Delete {len(ids_to_delete)} selected trade(s)", type="primary", disabled=not ids_to_delete, use_container_width=True):
+                deleted_count = bulk_delete_trades(ids_to_delete)
+                if deleted_count:
+                    _bump_trades_version()
+                if deleted_count == len(ids_to_delete):
+                    st.success(f"Deleted {deleted_count} trade(s).")
+                    st.rerun()
+                else: st.error(f"Deleted {deleted_count} of {len(ids_to_delete)} selected trade(s).")
+        else:
+            st.info("No trades in the system.")
+
+    @st.fragment
+    def _admin_view(portfolios):
         if not st.session_state.get('is_admin'):
             st.error("⛔ Access Denied.")
             st.stop()
@@ -171,87 +405,32 @@ if st.session_state.get("authentication_status"):
 
         with admin_tab1:
             st.subheader("Manage Users")
-            all_users_data = get_all_users()
-            if all_users_data:
-                users_df = pd.DataFrame(all_users_data)
-                st.dataframe(users_df[['user_id', 'username', 'name', 'email', 'registration_date', 'is_admin']], hide_index=True, use_container_width=True)
+            users_df = None
+            try:
+                users_df = _admin_users_df(_users_generation()["value"])
+            except Exception as e:
+                st.error(f"Could not load users from the database: {e}")
+            if users_df is not None and not users_df.empty:
+                st.dataframe(users_df, hide_index=True, use_container_width=True)
+                all_usernames = users_df['username'].tolist()
 
                 col_del, col_reset = st.columns(2)
                 with col_del:
                     st.subheader("Delete User")
-                    user_to_delete = st.selectbox("Select user to delete:", [""] + [u['username'] for u in all_users_data if u['username'] != username])
+                    user_to_delete = st.selectbox("Select user to delete:", [""] + [u for u in all_usernames if u != username])
                     if user_to_delete and st.button(f"⚠️ Delete User '{user_to_delete}'", type="primary"):
-                        if delete_user(user_to_delete): st.success(f"User '{user_to_delete}' deleted."); st.cache_data.clear(); st.rerun()
-                        else: st.error(f"Failed to delete '{user_to_delete}'.")
+                        _confirm_delete_user(user_to_delete)
                 with col_reset:
                     st.subheader("Reset User Password")
-                    user_to_reset = st.selectbox("Select user to reset:", [""] + [u['username'] for u in all_users_data])
+                    user_to_reset = st.selectbox("Select user to reset:", [""] + all_usernames)
                     if user_to_reset and st.button(f"🔑 Reset password for '{user_to_reset}'"):
-                        if update_user_password(user_to_reset, "password123"): st.success(f"Password for '{user_to_reset}' reset to: `password123`")
+                        if update_user_password(user_to_reset, "password123"): _invalidate_user_caches(); st.success(f"Password for '{user_to_reset}' reset to: `password123`")
                         else: st.error(f"Failed to reset password.")
-            else: st.info("No users found.")
+            elif users_df is not None: st.info("No users found.")
 
         with admin_tab2:
             st.subheader("Manage All Trades")
-            if not trades.empty:
-                st.info(f"Displaying all {len(trades)} trades in the system.")
-                # --- FIX for Bug #3: Sort by 'id' descending ---
-                sorted_trades = trades.sort_values(by='id', ascending=False)
-                
-                for index, trade in sorted_trades.iterrows():
-                    trade_id = trade['id']
-                    edit_key = f"edit_mode_{trade_id}"
-
-                    if st.session_state.get(edit_key, False):
-                        # --- EDIT MODE ---
-                        with st.container():
-                            cols = st.columns([2, 2, 2, 1, 1, 1, 1, 1, 1])
-                            cols[0].write(f"**{trade['participant']}**")
-                            
-                            default_ts = trade['timestamp'] if pd.notnull(trade['timestamp']) else datetime.now()
-                            new_date = cols[1].date_input("Date", value=default_ts, key=f"date_{trade_id}", label_visibility="collapsed")
-                            new_time = cols[2].time_input("Time", value=default_ts.time(), key=f"time_{trade_id}", label_visibility="collapsed")
-                            
-                            cols[3].write(trade['ticker'])
-                            cols[4].write(trade['action'])
-                            cols[5].write(f"{trade['shares']:,.0f}")
-                            cols[6].write(f"${trade['price']:.3f}")
-                            
-                            if cols[7].button("💾", key=f"save_{trade_id}", help="Save timestamp"):
-                                combined_dt = datetime.combine(new_date, new_time)
-                                if admin_update_trade_timestamp(trade_id, combined_dt):
-                                    st.success(f"Timestamp for trade {trade_id} updated.")
-                                    del st.session_state[edit_key]
-                                    st.cache_data.clear()
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to update timestamp.")
-                            if cols[8].button("❌", key=f"cancel_{trade_id}", help="Cancel edit"):
-                                del st.session_state[edit_key]
-                                st.rerun()
-                    else:
-                        # --- DISPLAY MODE ---
-                        cols = st.columns([2, 3, 1, 1, 1, 1, 1, 1])
-                        cols[0].write(f"**{trade['participant']}**")
-                        cols[1].write(trade['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if pd.notnull(trade['timestamp']) else "No Timestamp")
-                        cols[2].write(trade['ticker'])
-                        cols[3].write(trade['action'])
-                        cols[4].write(f"{trade['shares']:,.0f}")
-                        cols[5].write(f"${trade['price']:.3f}")
-
-                        if cols[6].button("✏️", key=f"edit_{trade_id}", help="Edit timestamp"):
-                            st.session_state[edit_key] = True
-                            # --- FIX for Bug #2: Removed st.rerun() ---
-                            st.rerun() # Re-adding rerun as it is the most reliable way to force the component state change immediately
-
-                        if cols[7].button("🗑️", key=f"admin_delete_{trade_id}", help=f"Delete Trade ID {trade_id}"):
-                            if admin_delete_trade(trade_id):
-                                st.success(f"Trade ID {trade_id} deleted.")
-                                st.cache_data.clear()
-                                st.rerun()
-                            else: st.error(f"Failed to delete trade ID {trade_id}.")
-            else:
-                st.info("No trades in the system.")
+            _admin_trades_editor()
 
         with admin_tab3:
             st.subheader("View Participant Dashboard")
@@ -267,6 +446,13 @@ if st.session_state.get("authentication_status"):
                     else: st.warning(f"No portfolio data found for {selected_user}")
             else: st.info("No participants with portfolios to display.")
 
+    if view_option == "My Dashboard":
+        _dashboard_view(portfolios)
+    elif view_option == "Leaderboard":
+        _leaderboard_view(portfolios)
+    elif view_option == "Admin Panel":
+        _admin_view(portfolios)
+
 # --- User NOT Logged In ---
 else:
     st.title("📈 Penny Stock Trading Competition")
@@ -294,5 +480,5 @@ else:
                 elif "@" not in reg_email or "." not in reg_email.split('@')[-1]: st.error("Please enter a valid email.")
                 else:
                     success, message = add_user(reg_username, reg_name, reg_email, reg_password)
-                    if success: st.success(message); st.info("Registration successful! Proceed to the Login tab.")
+                    if success: _invalidate_user_caches(); st.success(message); st.info("Registration successful! Proceed to the Login tab.")
                     else: st.error(message)
\ No newline at end of file
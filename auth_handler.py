@@ -3,6 +3,9 @@ import sqlite3
 import bcrypt
 import os
 from datetime import datetime
+from functools import lru_cache
+
+from database import acquire_connection, needs_initialization, release_connection
 
 DATA_DIR = "/data" # Define a data directory mount point
 # In auth_handler.py
@@ -16,13 +19,36 @@ else:
     # We are running locally, use the relative path
     DATABASE_FILE = "trades.db"
     
+# --- Cookie Configuration ---
+
+@lru_cache(maxsize=1)
+def get_cookie_config():
+    """Returns (cookie_name, cookie_key, cookie_expiry_days), resolved from the environment once per process."""
+    if 'RAILWAY_ENVIRONMENT' in os.environ:
+        try:
+            cookie_expiry = int(os.environ.get("COOKIE_EXPIRY_DAYS", "30"))
+        except ValueError:
+            cookie_expiry = 30
+        return os.environ.get("COOKIE_NAME"), os.environ.get("COOKIE_KEY"), cookie_expiry
+    return "pennystockcookie_local", "a_default_secret_key_for_local_dev", 30
+
 # --- Hashing Utilities ---
 
+def _bcrypt_rounds():
+    """bcrypt work factor from BCRYPT_ROUNDS (default 10, clamped to bcrypt's valid 4-31 range)."""
+    try:
+        return min(max(int(os.environ.get("BCRYPT_ROUNDS", "10")), 4), 31)
+    except ValueError:
+        return 10
+
+BCRYPT_ROUNDS = _bcrypt_rounds()
+BCRYPT_PREFIXES = (b'$2a$', b'$2b$', b'$2y$')
+
 def hash_password(plain_password):
     """Hashes a plain text password using bcrypt."""
     try:
         pwd_bytes = plain_password.encode('utf-8')
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(pwd_bytes, salt)
         return hashed.decode('utf-8') # Store hash as string
     except Exception as e:
@@ -30,10 +56,13 @@ def hash_password(plain_password):
         return None
 
 def check_password(plain_password, hashed_password):
-    """Checks if a plain text password matches a stored bcrypt hash."""
+    """Checks if a plain text password matches a stored bcrypt hash (str, or bytes as preloaded by get_user_by_username)."""
+    hashed_bytes = hashed_password.encode('utf-8') if isinstance(hashed_password, str) else hashed_password
+    # Cheap early-out so malformed or missing inputs never reach the bcrypt KDF
+    if plain_password is None or not isinstance(hashed_bytes, bytes) or not hashed_bytes.startswith(BCRYPT_PREFIXES):
+        return False
     try:
         plain_bytes = plain_password.encode('utf-8')
-        hashed_bytes = hashed_password.encode('utf-8')
         return bcrypt.checkpw(plain_bytes, hashed_bytes)
     except Exception as e:
         print(f"Error checking password: {e}")
@@ -46,7 +75,7 @@ def init_auth_db():
     conn = None
     try:
         os.makedirs(DATA_DIR, exist_ok=True)
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -60,10 +89,10 @@ def init_auth_db():
             )
         ''')
 
-        try:
-            cursor.execute("SELECT is_admin FROM users LIMIT 1")
+        user_columns = {row[1] for row in cursor.execute("PRAGMA table_info(users)")}
+        if 'is_admin' in user_columns:
             print("'is_admin' column already exists.")
-        except sqlite3.OperationalError:
+        else:
             print("Adding 'is_admin' column to users table...")
             cursor.execute("ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT 0 NOT NULL")
             print("'is_admin' column added.")
@@ -77,7 +106,7 @@ def init_auth_db():
         print(f"Database error during auth initialization: {e}")
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 # --- User Management Functions ---
 
@@ -89,7 +118,7 @@ def add_user(username, name, email, plain_password):
 
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
         cursor = conn.cursor()
 
         # --- Check if any users exist ---
@@ -139,37 +168,38 @@ def add_user(username, name, email, plain_password):
         return False, f"Database error: {e}"
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def get_user_by_username(username):
     """Retrieves user details (including is_admin) by username (case-insensitive).""" # Updated docstring
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        conn.row_factory = sqlite3.Row
+        conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
         cursor = conn.cursor()
         # --- MODIFIED QUERY: Added COLLATE NOCASE ---
         sql = "SELECT user_id, username, name, email, hashed_password, is_admin FROM users WHERE username = ? COLLATE NOCASE"
         cursor.execute(sql, (username,))
         # -------------------------------------------
         user_data = cursor.fetchone()
-        # --- ADD extra debug ---
-        print(f"--- [DEBUG INSIDE HANDLER] Fetched data for '{username}': {user_data}")
-         # Convert to dict only if user_data is not None
-        return dict(user_data) if user_data else None
+        # Convert to dict only if user_data is not None
+        if not user_data:
+            return None
+        user = dict(user_data)
+        # Encode once here so check_password doesn't re-encode the stored hash on every attempt
+        user['hashed_password_bytes'] = user['hashed_password'].encode('utf-8')
+        return user
     except sqlite3.Error as e:
         print(f"Database error fetching user by username '{username}': {e}")
         return None
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def get_user_by_email(email):
      """Retrieves user details by email."""
      conn = None
      try:
-         conn = sqlite3.connect(DATABASE_FILE)
-         conn.row_factory = sqlite3.Row
+         conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
          cursor = conn.cursor()
          cursor.execute("SELECT user_id, username, name, email, hashed_password FROM users WHERE email = ?", (email,))
          user_data = cursor.fetchone()
@@ -179,16 +209,14 @@ def get_user_by_email(email):
          return None
      finally:
          if conn:
-             conn.close()
+             release_connection(conn)
 
 
 def get_all_users():
     """Retrieves all users (including all necessary columns) for admin panel and streamlit-authenticator."""
     conn = None
-    users = []
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        conn.row_factory = sqlite3.Row # Get rows as dictionary-like objects
+        conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
         cursor = conn.cursor()
         # --- CORRECTED SQL QUERY ---
         # Ensure ALL columns needed by app.py are selected here
@@ -205,23 +233,21 @@ def get_all_users():
             ORDER BY username
         """)
         # --------------------------
-        rows = cursor.fetchall()
-        for row in rows:
-            users.append(dict(row)) # Convert each row to a dictionary
-        return users
+        # sqlite3.Row already supports row['username'] access, so rows are returned without a per-row dict copy
+        return cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Database error fetching all users: {e}")
-        # Consider raising the error or returning empty list depending on desired handling
-        return [] # Return empty list on error
+        # Raised rather than returned as [], so a transient error is never cached as "no users exist"
+        raise
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def delete_user(username_to_delete: str) -> bool:
     """Deletes a user by username. Returns True on success, False on failure."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
         cursor = conn.cursor()
         # Delete the user matching the username
         sql = "DELETE FROM users WHERE username = ?"
@@ -242,7 +268,7 @@ def delete_user(username_to_delete: str) -> bool:
          return False
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def update_user_password(username: str, new_plain_password: str) -> bool:
     """Hashes a new password and updates it for a given user."""
@@ -253,7 +279,7 @@ def update_user_password(username: str, new_plain_password: str) -> bool:
 
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE, row_factory=sqlite3.Row)
         cursor = conn.cursor()
         sql = "UPDATE users SET hashed_password = ? WHERE username = ?"
         cursor.execute(sql, (new_hashed_password, username))
@@ -270,9 +296,10 @@ def update_user_password(username: str, new_plain_password: str) -> bool:
         return False
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 
-# --- Initialize DB on module load ---
-print(f"Auth handler module loaded. Checking/Initializing users table in: {DATABASE_FILE}")
-init_auth_db()
\ No newline at end of file
+# --- Initialize DB on module load (once per process and database file; skipped when Streamlit re-imports this module) ---
+if needs_initialization("auth", DATABASE_FILE):
+    print(f"Auth handler module loaded. Checking/Initializing users table in: {DATABASE_FILE}")
+    init_auth_db()
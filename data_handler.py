@@ -4,22 +4,40 @@ import os
 import sqlite3
 from datetime import datetime
 
+from database import acquire_connection, release_connection
+
 # --- Smart Database Path ---
 if 'RAILWAY_ENVIRONMENT' in os.environ:
     DATABASE_FILE = "/data/trades.db"
 else:
     DATABASE_FILE = "trades.db"
 
+TRADE_COLUMNS = ['id', 'participant', 'timestamp', 'ticker', 'action', 'shares', 'price']
+INSERT_COLUMNS = TRADE_COLUMNS[1:]
+# Compact dtypes for read-only use; money columns stay float64 so P/L sums don't lose precision
+LOAD_DTYPES = {
+    'id': 'int32', 'participant': 'string', 'ticker': 'string',
+    # Not a Buy/Sell categorical: the schema doesn't constrain action, and a categorical cast would turn anything else into NaN
+    'action': 'string',
+    'shares': 'float64', 'price': 'float64',
+}
+LOAD_CHUNK_SIZE = 10_000
+# Every writer stores timestamps in this one format, so parsing can skip per-element format inference
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
 # --- Database Initialization ---
 
 def init_db():
     """Initializes the database and creates the trades table if it doesn't exist."""
+    conn = None
     try:
         if 'RAILWAY_ENVIRONMENT' in os.environ:
             os.makedirs(os.path.dirname(DATABASE_FILE), exist_ok=True)
 
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE)
         cursor = conn.cursor()
+        # WAL is a persistent database setting: readers no longer block on writers, and commits append instead of rewriting
+        cursor.execute("PRAGMA journal_mode=WAL")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS trades (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -31,36 +49,79 @@ def init_db():
             price REAL NOT NULL
         )
         ''')
+        # Indexes for time-ordered loads and the per-position lookup behind sell validation
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_participant_ticker ON trades (participant, ticker)")
         conn.commit()
         print(f"Database '{DATABASE_FILE}' initialized successfully.")
     except sqlite3.Error as e:
         print(f"Database error during initialization: {e}")
     finally:
-        if 'conn' in locals() and conn:
-            conn.close()
+        if conn:
+            release_connection(conn)
+
+def _typed_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """Fixes dtypes once here so callers never need to re-clean the frame."""
+    df = df.astype(LOAD_DTYPES)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+    return df
 
 def load_data() -> pd.DataFrame:
-    """Loads all trade data from the SQLite database into a Pandas DataFrame."""
+    """Loads trade data from the SQLite database into a Pandas DataFrame."""
     if not os.path.exists(DATABASE_FILE):
         print(f"Database file {DATABASE_FILE} not found. Initializing.")
         init_db()
-        return pd.DataFrame(columns=['id', 'participant', 'timestamp', 'ticker', 'action', 'shares', 'price'])
+        return pd.DataFrame(columns=TRADE_COLUMNS)
 
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        query = "SELECT id, participant, timestamp, ticker, action, shares, price FROM trades"
-        df = pd.read_sql_query(query, conn)
-        if 'timestamp' in df.columns and not df.empty:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+        conn = acquire_connection(DATABASE_FILE)
+        # Ordered by SQLite off the timestamp index, so the portfolio replay gets pre-sorted input
+        cursor = conn.execute("SELECT id, participant, timestamp, ticker, action, shares, price FROM trades ORDER BY timestamp, id")
+        columns = [description[0] for description in cursor.description]
+        # Plain tuple batches straight into from_records, so only one chunk of raw Python rows is alive at a time
+        frames = []
+        while rows := cursor.fetchmany(LOAD_CHUNK_SIZE):
+            frames.append(_typed_trades(pd.DataFrame.from_records(rows, columns=columns)))
+        df = pd.concat(frames, ignore_index=True) if frames else _typed_trades(pd.DataFrame(columns=columns))
         print(f"Loaded {len(df)} records from {DATABASE_FILE}")
         return df
     except Exception as e:
         print(f"An unexpected error occurred during data load: {e}")
-        return pd.DataFrame()
+        # Raised rather than returned as an empty frame, so callers' caches never store a failed read as "no trades"
+        raise
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
+
+def get_shares_held(participant: str, ticker: str) -> float:
+    """
+    Returns how many shares of a ticker a participant currently holds, using the same replay
+    rules as calculate_portfolio (a sell larger than the position is ignored).
+    """
+    conn = None
+    try:
+        conn = acquire_connection(DATABASE_FILE)
+        # Served by idx_trades_participant_ticker; NULL timestamps sort last, as in the portfolio replay
+        cursor = conn.execute(
+            "SELECT action, shares FROM trades WHERE participant = ? AND ticker = ? ORDER BY timestamp IS NULL, timestamp, id",
+            (participant, ticker)
+        )
+        held = 0.0
+        for action, shares in cursor:
+            if action == 'Buy':
+                held += shares
+            elif action == 'Sell' and held >= shares:
+                held -= shares
+                if held < 1e-6:
+                    held = 0.0
+        return held
+    except Exception as e:
+        print(f"Database error reading {participant}'s {ticker} position: {e}")
+        return 0.0
+    finally:
+        if conn:
+            release_connection(conn)
 
 def log_trade(participant: str, ticker: str, action: str, shares: float, price: float):
     """
@@ -69,10 +130,10 @@ def log_trade(participant: str, ticker: str, action: str, shares: float, price:
     """
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE)
         cursor = conn.cursor()
         # Generate timestamp right before insertion
-        timestamp_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        timestamp_str = datetime.now().strftime(TIMESTAMP_FORMAT)
         
         sql = """
         INSERT INTO trades (participant, timestamp, ticker, action, shares, price)
@@ -87,35 +148,39 @@ def log_trade(participant: str, ticker: str, action: str, shares: float, price:
         return False
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
-def save_trade(new_trade_df: pd.DataFrame):
-    """Saves one or more new trades from a DataFrame (used for CSV import)."""
+def save_trade(new_trade_df: pd.DataFrame) -> bool:
+    """Saves one or more new trades from a DataFrame (used for CSV import) in a single transaction."""
     if new_trade_df.empty:
-        return
-    df_to_save = new_trade_df.copy()
-    if 'timestamp' in df_to_save.columns:
-        # Convert datetime objects to string for database compatibility
-        df_to_save['timestamp'] = df_to_save['timestamp'].apply(
-            lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if pd.notnull(x) else None
-        )
+        return True
+    df_to_save = new_trade_df[INSERT_COLUMNS].copy()
+    # Convert datetime objects to string for database compatibility, in one vectorized pass
+    timestamps = pd.to_datetime(df_to_save['timestamp'], errors='coerce')
+    # object dtype so missing timestamps reach SQLite as NULL rather than NaN
+    df_to_save['timestamp'] = timestamps.dt.strftime(TIMESTAMP_FORMAT).astype(object).where(timestamps.notna(), None)
 
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        df_to_save.to_sql('trades', conn, if_exists='append', index=False)
+        conn = acquire_connection(DATABASE_FILE)
+        sql = f"INSERT INTO trades ({', '.join(INSERT_COLUMNS)}) VALUES ({', '.join('?' * len(INSERT_COLUMNS))})"
+        # One executemany inside one transaction: a single commit for the whole file, and all-or-nothing on error
+        with conn:
+            conn.executemany(sql, df_to_save.itertuples(index=False, name=None))
         print(f"Saved {len(df_to_save)} trade(s) to database from DataFrame.")
+        return True
     except Exception as e:
         print(f"Database error saving trade from DataFrame: {e}")
+        return False
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def delete_trade(trade_id: int, username: str) -> bool:
     """Deletes a specific trade by its ID, ensuring it belongs to the user."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE)
         cursor = conn.cursor()
         sql = "DELETE FROM trades WHERE id = ? AND participant = ?"
         cursor.execute(sql, (trade_id, username))
@@ -127,33 +192,37 @@ def delete_trade(trade_id: int, username: str) -> bool:
         return False
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
-def admin_delete_trade(trade_id: int) -> bool:
-    """Deletes a single trade by its ID, for admin use."""
+def bulk_delete_trades(trade_ids) -> int:
+    """Deletes several trades by ID in one statement and commit, for admin use. Returns the number deleted."""
+    trade_ids = [int(trade_id) for trade_id in trade_ids]
+    if not trade_ids:
+        return 0
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE)
         cursor = conn.cursor()
-        sql = "DELETE FROM trades WHERE id = ?"
-        cursor.execute(sql, (trade_id,))
+        placeholders = ','.join('?' * len(trade_ids))
+        sql = f"DELETE FROM trades WHERE id IN ({placeholders})"
+        cursor.execute(sql, trade_ids)
         deleted_count = cursor.rowcount
         conn.commit()
-        return deleted_count > 0
+        return deleted_count
     except Exception as e:
-        print(f"Database error during admin delete for trade ID {trade_id}: {e}")
-        return False
+        print(f"Database error during bulk delete of {len(trade_ids)} trade(s): {e}")
+        return 0
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def admin_update_trade_timestamp(trade_id: int, new_timestamp: datetime) -> bool:
     """Updates the timestamp for a specific trade, for admin use."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = acquire_connection(DATABASE_FILE)
         cursor = conn.cursor()
-        timestamp_str = new_timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        timestamp_str = new_timestamp.strftime(TIMESTAMP_FORMAT)
         sql = "UPDATE trades SET timestamp = ? WHERE id = ?"
         cursor.execute(sql, (timestamp_str, trade_id))
         updated_count = cursor.rowcount
@@ -164,7 +233,7 @@ def admin_update_trade_timestamp(trade_id: int, new_timestamp: datetime) -> bool
         return False
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def process_and_save_csv(uploaded_file, participant_name: str) -> (bool, str):
     """Reads a CSV file, validates it, and saves the trades to the database."""
@@ -179,34 +248,47 @@ def process_and_save_csv(uploaded_file, participant_name: str) -> (bool, str):
     if missing_cols:
         return False, f"CSV is missing required columns: {', '.join(missing_cols)}"
 
-    df = df[required_columns]
-    df.dropna(inplace=True)
+    df = df[required_columns].copy()
+    # Rows missing any required field, computed once and folded into the final mask instead of a dropna copy
+    complete = df.notna().all(axis=1).to_numpy()
 
-    if df.empty:
+    if not complete.any():
         return False, "No valid trade data found in the uploaded file after cleaning."
 
     try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+        # Fast fixed-format parse first; only rows in some other format fall back to inference
+        timestamps = pd.to_datetime(df['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+        unparsed = timestamps.isna()
+        if unparsed.any():
+            # utc=True so offset-suffixed values (e.g. a trailing Z) parse alongside naive ones; then back to naive UTC
+            # at the fast path's unit, since assigning tz-aware or finer-unit values into it would raise
+            fallback = pd.to_datetime(df.loc[unparsed, 'timestamp'], format='mixed', utc=True, errors='coerce')
+            timestamps = timestamps.fillna(fallback.dt.tz_convert(None).astype(timestamps.dtype))
+        df['timestamp'] = timestamps
         df['shares'] = pd.to_numeric(df['shares'], errors='coerce')
         df['price'] = pd.to_numeric(df['price'], errors='coerce')
         df['action'] = df['action'].str.strip().str.title()
     except Exception as e:
         return False, f"Error converting data types in CSV: {e}"
 
-    df.dropna(inplace=True)
-    df = df[df['action'].isin(['Buy', 'Sell'])]
-    df = df[(df['shares'] > 0) & (df['price'] > 0)]
+    # One boolean mask and one row selection; NaN shares/prices from the coercion fail the > 0 checks
+    valid = (
+        complete
+        & df['timestamp'].notna().to_numpy()
+        & df['action'].isin(('Buy', 'Sell')).to_numpy()
+        & (df['shares'].to_numpy() > 0)
+        & (df['price'].to_numpy() > 0)
+    )
+    df = df.loc[valid]
 
     if df.empty:
         return False, "No valid trade data remaining after validation."
 
     df['participant'] = participant_name
 
-    try:
-        save_trade(df)
+    if save_trade(df):
         return True, f"Successfully imported {len(df)} trades!"
-    except Exception as e:
-        return False, f"A database error occurred during import: {e}"
+    return False, "A database error occurred during import; no trades were saved."
 
 # --- Call init_db() once on module load to ensure DB/table exists ---
 print(f"Data handler module loaded. Checking/Initializing DB: {DATABASE_FILE}")
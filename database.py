@@ -0,0 +1,78 @@
+# database.py
+import atexit
+import sqlite3
+import threading
+
+# --- Shared Connection ---
+# data_handler and auth_handler both talk to the same SQLite file, so they share one connection per process
+# instead of an open/close per call; the lock serializes access across Streamlit threads.
+_db_lock = threading.Lock()
+_connection = None
+_connection_path = None
+# Schema setups already run in this process, keyed by (setup name, database file). Kept here rather than in the
+# handlers because Streamlit's watcher re-imports a changed handler into a fresh namespace, wiping any flag it held.
+_initialized = set()
+
+def _connect(database_file):
+    """Opens a connection with the per-connection pragmas (WAL itself is set once, persistently, by init_db)."""
+    conn = sqlite3.connect(database_file, check_same_thread=False)
+    # In WAL mode NORMAL only syncs at checkpoints, instead of fsyncing on every commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Wait up to 5s for another process's write lock instead of failing with "database is locked"
+    conn.execute("PRAGMA busy_timeout=5000")
+    # The long-lived connection lets commits accumulate in the WAL and checkpoint every ~1000 pages, not on every close
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    return conn
+
+def acquire_connection(database_file, row_factory=None):
+    """Takes the shared lock and returns the shared connection, reopening it if database_file has changed."""
+    global _connection, _connection_path
+    _db_lock.acquire()
+    try:
+        if _connection is None or _connection_path != database_file:
+            if _connection is not None:
+                _connection.close()
+                _connection = None
+            _connection = _connect(database_file)
+            _connection_path = database_file
+        # Set per call: auth_handler reads sqlite3.Row objects, data_handler plain tuples
+        _connection.row_factory = row_factory
+        return _connection
+    except Exception:
+        _db_lock.release()
+        raise
+
+def release_connection(conn):
+    """Rolls back anything a failed call left uncommitted, then releases the shared lock."""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    finally:
+        _db_lock.release()
+
+def needs_initialization(name, database_file):
+    """Returns True the first time a given schema setup is requested for database_file in this process."""
+    with _db_lock:
+        key = (name, database_file)
+        if key in _initialized:
+            return False
+        _initialized.add(key)
+        return True
+
+@atexit.register
+def close_connection():
+    """Folds the WAL back into the database file and closes the shared connection at interpreter exit."""
+    global _connection, _connection_path
+    # Don't hang shutdown behind a thread that still holds the lock
+    if not _db_lock.acquire(timeout=5):
+        return
+    try:
+        if _connection is not None:
+            _connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            _connection.close()
+    except sqlite3.Error as e:
+        print(f"Database error while closing connection: {e}")
+    finally:
+        _connection = None
+        _connection_path = None
+        _db_lock.release()
@@ -5,6 +5,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
+from portfolio import INITIAL_CAPITAL
+
 # --- Style Constants and Formatting Functions ---
 GAIN_COLOR = "#2ECC71"  # A nice green
 LOSS_COLOR = "#E74C3C"  # A nice red
@@ -85,24 +87,20 @@ def display_portfolio_value_chart(value_history, user_trades, participant_name):
 # --- Leaderboard Charts ---
 def display_leaderboard_value_chart(portfolios_data):
     st.subheader("All Participants Value Over Time")
-    all_history_dfs = []
     if not portfolios_data:
         st.info("No portfolio data available.")
         return
-    for participant, data in portfolios_data.items():
-        history = data.get('value_history')
-        if history and isinstance(history, (list, dict)) and len(history) >= 2:
-            try:
-                df = pd.DataFrame(history)
-                df['participant'] = participant
-                all_history_dfs.append(df)
-            except Exception as e:
-                st.warning(f"Could not process history for {participant}: {e}")
-    if not all_history_dfs:
+    histories = {
+        participant: data['value_history'] for participant, data in portfolios_data.items()
+        if isinstance(data.get('value_history'), list) and len(data['value_history']) >= 2
+    }
+    if not histories:
         st.info("Not enough valid data points across participants to plot value history.")
         return
     try:
-        combined_df = pd.concat(all_history_dfs, ignore_index=True)
+        # One frame for every participant's points instead of a frame per participant plus a concat
+        combined_df = pd.DataFrame([point for history in histories.values() for point in history])
+        combined_df['participant'] = pd.Series(list(histories)).repeat([len(h) for h in histories.values()]).to_numpy()
         combined_df['timestamp'] = pd.to_datetime(combined_df['timestamp'])
         combined_df = combined_df.sort_values(by='timestamp')
         time_frame_leaderboard = st.radio("Select Time Frame:", ("1D", "1W", "1M", "All"), index=3, horizontal=True, key="time_filter_leaderboard")
@@ -120,15 +118,13 @@ def display_leaderboard_value_chart(portfolios_data):
     except Exception as e:
          st.error(f"Error plotting combined value chart: {e}")
 
-def display_leaderboard_bar_chart(leaderboard_table_data):
+def display_leaderboard_bar_chart(leaderboard_df):
     st.subheader("Current Standings by Portfolio Value")
-    if not leaderboard_table_data:
+    if leaderboard_df is None or leaderboard_df.empty:
         st.info("No leaderboard data to display.")
         return
     try:
-        df = pd.DataFrame(leaderboard_table_data)
-        df = df.sort_values(by='Total Value ($)', ascending=False)
-        initial_capital = 500.0
+        df = leaderboard_df.copy()  # Already sorted by performance (same order as total value)
         df['color'] = df['Performance (%)'].apply(lambda p: GAIN_COLOR if p > 0 else LOSS_COLOR if p < 0 else NEUTRAL_COLOR)
         fig = go.Figure()
         fig.add_trace(go.Bar(
@@ -137,7 +133,7 @@ def display_leaderboard_bar_chart(leaderboard_table_data):
             text=df['Total Value ($)'].apply(format_currency), hoverinfo='text',
             hovertext=df.apply(lambda row: f"<b>{row['Participant']}</b><br>Value: {format_currency(row['Total Value ($)'])}<br>Perf: {format_percentage(row['Performance (%)'])}", axis=1)
         ))
-        fig.add_vline(x=initial_capital, line_width=2, line_dash="dash", line_color="white", annotation_text="Starting Capital", annotation_position="bottom right")
+        fig.add_vline(x=INITIAL_CAPITAL, line_width=2, line_dash="dash", line_color="white", annotation_text="Starting Capital", annotation_position="bottom right")
         fig.update_layout(
             title_text='Leaderboard: Current Portfolio Value', xaxis_title='Total Value ($)', yaxis_title=None,
             yaxis=dict(autorange="reversed"), height=max(400, len(df) * 50), showlegend=False, bargap=0.3,
@@ -175,28 +171,45 @@ def display_portfolio_composition_chart(participant_data):
 
 
 # --- display_trade_history ---
-def display_trade_history(trades):
+def display_trade_history(trades, on_delete_trade=None, trades_version=0):
+    """
+    Renders the trade history as a single dataframe. When on_delete_trade is given,
+    rows become selectable and one delete button acts on the selected trade's id.
+    """
     st.subheader(f"Trade History")
     if isinstance(trades, pd.DataFrame) and not trades.empty:
         try:
+            sorted_trades = trades.sort_values(by='timestamp', ascending=False, kind='mergesort')
             cols_to_display = ['timestamp', 'ticker', 'action', 'shares', 'price']
-            display_df = trades[cols_to_display].copy()
-            rename_map = {'timestamp': 'Timestamp', 'ticker': 'Ticker', 'action': 'Action', 'shares': 'Shares', 'price': 'Price ($)',}
-            display_df.rename(columns=rename_map, inplace=True)
-            display_df['Price ($)'] = display_df['Price ($)'].apply(lambda x: f"{x:,.2f}" if pd.notnull(x) else '')
-            display_df['Timestamp'] = pd.to_datetime(display_df['Timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-            st.dataframe(display_df.sort_values(by='Timestamp', ascending=False), use_container_width=True, hide_index=True)
+            column_config = {
+                'timestamp': st.column_config.DatetimeColumn('Timestamp', format='YYYY-MM-DD HH:mm:ss'),
+                'ticker': 'Ticker',
+                'action': 'Action',
+                'shares': 'Shares',
+                'price': st.column_config.NumberColumn('Price ($)', format='%.2f'),
+            }
+            if on_delete_trade is None:
+                st.dataframe(sorted_trades[cols_to_display], column_config=column_config, use_container_width=True, hide_index=True)
+                return
+
+            event = st.dataframe(
+                sorted_trades[cols_to_display], column_config=column_config, use_container_width=True, hide_index=True,
+                # Versioned key: a keyed selection survives data changes, so a delete must start a fresh, empty selection
+                on_select="rerun", selection_mode="single-row", key=f"trade_history_table_{trades_version}"
+            )
+            selected_rows = event.selection.rows
+            if st.button("🗑️ Delete selected trade", disabled=not selected_rows, key="delete_selected_trade"):
+                on_delete_trade(int(sorted_trades.iloc[selected_rows[0]]['id']))
         except Exception as e: st.error(f"Error displaying trade history: {e}")
     else: st.info("No trades recorded yet.")
 
 
 # --- display_portfolio ---
-def display_portfolio(participant_data):
+def display_portfolio(participant_data, on_delete_trade=None, trades_version=0):
     st.subheader(f"Portfolio Summary")
     col1, col2, col3, col4 = st.columns(4)
-    initial_capital = 500
-    total_value = participant_data.get('total_value', initial_capital)
-    performance = ((total_value - initial_capital) / initial_capital) * 100 if initial_capital > 0 else 0
+    total_value = participant_data.get('total_value', INITIAL_CAPITAL)
+    performance = ((total_value - INITIAL_CAPITAL) / INITIAL_CAPITAL) * 100
     with col1: st.metric("💵 Cash Balance", format_currency(participant_data.get('cash')))
     with col2: st.metric("💰 Total Value", format_currency(total_value))
     with col3: st.metric(label="📈 Net Realized P/L", value=format_currency(participant_data.get('total_realized_pl', 0)))
@@ -259,32 +272,29 @@ def display_portfolio(participant_data):
     
     st.divider()
 
-    display_trade_history(participant_data.get('trades'))
+    display_trade_history(participant_data.get('trades'), on_delete_trade=on_delete_trade, trades_version=trades_version)
 
 
 # --- display_leaderboard ---
-def display_leaderboard(leaderboard_table_data, all_portfolios_data):
+def display_leaderboard(leaderboard_df, all_portfolios_data):
     st.header("👑 Leaderboard")
-    display_leaderboard_bar_chart(leaderboard_table_data)
+    display_leaderboard_bar_chart(leaderboard_df)
     st.divider()
     with st.expander("Show Detailed History and Standings Table"):
         display_leaderboard_value_chart(all_portfolios_data)
         st.divider()
         st.subheader("Standings Table")
-        if leaderboard_table_data:
+        if leaderboard_df is not None and not leaderboard_df.empty:
             try:
-                leaderboard_df = pd.DataFrame(leaderboard_table_data)
-                leaderboard_df['Performance (%)'] = pd.to_numeric(leaderboard_df['Performance (%)'], errors='coerce')
-                leaderboard_df = leaderboard_df.sort_values(by='Performance (%)', ascending=False, na_position='last')
-                leaderboard_df = leaderboard_df.reset_index(drop=True)
-                leaderboard_df.index += 1
-                leaderboard_df.index.name = 'Rank'
-                styled_df = leaderboard_df.style\
+                standings_df = leaderboard_df.copy()  # Already sorted by performance
+                standings_df.index += 1
+                standings_df.index.name = 'Rank'
+                styled_df = standings_df.style\
                     .map(color_performance, subset=['Performance (%)'])\
                     .format({'Performance (%)': '{:.2f}%', 'Total Value ($)': '${:,.2f}'})
                 st.dataframe(styled_df, use_container_width=True)
             except Exception as e:
                 st.error(f"Error displaying leaderboard table: {e}")
-                st.dataframe(leaderboard_table_data)
+                st.dataframe(leaderboard_df)
         else:
             st.info("No trades recorded yet for the leaderboard.")
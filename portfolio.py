@@ -6,8 +6,10 @@ import streamlit as st
 
 from utils import get_current_price
 
+INITIAL_CAPITAL = 500.0  # Starting cash for every participant; display and leaderboard percentages use this too
+
 # --- MODIFIED: More efficient historical price fetching ---
-@st.cache_data
+@st.cache_data(ttl=300, show_spinner=False)
 def get_historical_prices(tickers, start_date, end_date):
     """
     Fetches historical daily closing prices for a list of tickers
@@ -27,15 +29,14 @@ def get_historical_prices(tickers, start_date, end_date):
         return pd.DataFrame()
 
 
-@st.cache_data
-def calculate_portfolio(trades_df: pd.DataFrame):
+def calculate_portfolio(trades_df: pd.DataFrame, price_map: dict = None):
     """
     Calculates the daily portfolio value for each participant from the first trade to today.
+    An optional price_map of {ticker: latest price} skips the live lookup for those tickers.
     """
     if trades_df.empty:
         return {}
 
-    initial_capital = 500.0
     portfolios = {}
     all_tickers = trades_df['ticker'].unique().tolist()
     
@@ -49,29 +50,35 @@ def calculate_portfolio(trades_df: pd.DataFrame):
     if historical_prices.empty:
         st.warning("Could not fetch any historical price data. Graphs may be inaccurate.")
 
-    latest_prices_str = get_current_price(all_tickers)
-    if latest_prices_str is None:
-        latest_prices_str = {}
+    latest_prices_str = dict(price_map or {})
+    missing_tickers = [t for t in all_tickers if t not in latest_prices_str]
+    if missing_tickers:
+        # Sorted so the cached price lookup is hit regardless of trade order
+        latest_prices_str.update(get_current_price(sorted(missing_tickers)) or {})
     latest_prices = {k: v for k, v in latest_prices_str.items() if isinstance(v, (int, float))}
     
-    participants = trades_df['participant'].unique()
+    # One hash-partitioning pass, sorted once, instead of a full-frame mask (and sort) per participant per day.
+    # Stable, so same-second trades keep load_data's id order (the default quicksort may swap a buy and its sell)
+    trades_by_participant = {p: g.sort_values(by='timestamp', kind='stable') for p, g in trades_df.groupby('participant', sort=False)}
+    participants = list(trades_by_participant)
     for participant in participants:
         portfolios[participant] = {
             'participant': participant,
-            'cash': initial_capital,
+            'cash': INITIAL_CAPITAL,
             'holdings': {},
             'realized_pl': 0,
             'value_history': [],
-            'trades': trades_df[trades_df['participant'] == participant].copy()
+            'trades': trades_by_participant[participant]
         }
 
     for current_date in pd.date_range(start=start_date, end=end_date):
-        daily_trades = trades_df[trades_df['timestamp'] < current_date + timedelta(days=1)]
+        cutoff = current_date + timedelta(days=1)
 
         for participant in participants:
-            participant_trades = daily_trades[daily_trades['participant'] == participant].sort_values(by='timestamp')
+            participant_trades = trades_by_participant[participant]
+            participant_trades = participant_trades[participant_trades['timestamp'] < cutoff]
             
-            cash = initial_capital
+            cash = INITIAL_CAPITAL
             holdings = {}
             realized_pl = 0
 
@@ -118,9 +125,9 @@ def calculate_portfolio(trades_df: pd.DataFrame):
             })
 
     for participant in participants:
-        participant_trades = trades_df[trades_df['participant'] == participant].sort_values(by='timestamp')
+        participant_trades = trades_by_participant[participant]
         
-        cash = initial_capital
+        cash = INITIAL_CAPITAL
         holdings = {}
         realized_pl = 0
         
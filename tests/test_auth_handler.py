@@ -1,8 +1,15 @@
 # tests/test_auth_handler.py
+import importlib
+import sqlite3
+import sys
 import pytest
+from unittest import mock
+
+import auth_handler
+import database
 
 # Make sure auth_handler can be imported
-from auth_handler import hash_password, check_password
+from auth_handler import hash_password, check_password, get_cookie_config
 
 def test_password_hashing_and_checking():
     """Test that hashing creates a valid hash and checking works."""
@@ -24,6 +31,13 @@ def test_password_hashing_and_checking():
     assert check_password("", hash_password("")) is True
     assert check_password("a", hash_password("")) is False
 
+def test_hash_uses_configured_rounds(monkeypatch):
+    """hash_password honours BCRYPT_ROUNDS, and existing hashes still verify at their own cost."""
+    monkeypatch.setattr(auth_handler, "BCRYPT_ROUNDS", 4)
+    hashed = hash_password("password123")
+    assert hashed.startswith("$2b$04$")
+    assert check_password("password123", hashed) is True
+
 def test_hash_with_none_input():
     """Test that hash_password returns None when input is None."""
     # The function catches the internal AttributeError and returns None
@@ -40,6 +54,85 @@ def test_check_password_with_none_input():
     # Optionally test None hash too if relevant for your logic
     # assert check_password("some_password", None) is False
 
+def test_check_password_skips_bcrypt_for_malformed_hash():
+    """Missing or non-bcrypt hashes are rejected without running the KDF."""
+    with mock.patch("auth_handler.bcrypt.checkpw") as mock_checkpw:
+        assert check_password("password123", None) is False
+        assert check_password("password123", "not-a-bcrypt-hash") is False
+        mock_checkpw.assert_not_called()
+
 # Add tests for other auth_handler functions (add_user, get_user) later
 # These will require mocking the database connection (sqlite3.connect)
-# or using a temporary in-memory database.
\ No newline at end of file
+# or using a temporary in-memory database.
+
+def test_cookie_config_local_defaults(monkeypatch):
+    """Without RAILWAY_ENVIRONMENT the local cookie defaults are returned and memoized."""
+    monkeypatch.delenv("RAILWAY_ENVIRONMENT", raising=False)
+    get_cookie_config.cache_clear()
+    try:
+        assert get_cookie_config() == ("pennystockcookie_local", "a_default_secret_key_for_local_dev", 30)
+        assert get_cookie_config.cache_info().currsize == 1
+    finally:
+        get_cookie_config.cache_clear()
+
+
+def test_shared_connection_survives_failed_insert(tmp_path, monkeypatch):
+    """A failed write is rolled back so the shared connection stays usable."""
+    monkeypatch.setattr(auth_handler, "DATABASE_FILE", str(tmp_path / "users.db"))
+    auth_handler.init_auth_db()
+
+    assert auth_handler.add_user("alice", "Alice", "a@x.com", "pw")[0] is True
+    assert auth_handler.add_user("alice", "Alice", "other@x.com", "pw")[0] is False
+
+    assert not database._connection.in_transaction
+    # Same pragmas as the trades side, since both handlers go through database.py
+    assert database._connection.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    user = auth_handler.get_user_by_username("ALICE")
+    assert user["is_admin"] == 1
+    assert check_password("pw", user["hashed_password_bytes"]) is True
+    assert [u["username"] for u in auth_handler.get_all_users()] == ["alice"]
+
+
+def test_init_auth_db_adds_missing_is_admin_column(tmp_path, monkeypatch):
+    """An older users table without is_admin is migrated in place."""
+    db_file = str(tmp_path / "legacy.db")
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("""
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL, hashed_password TEXT NOT NULL, registration_date TEXT NOT NULL
+            )
+        """)
+    conn.close()
+    monkeypatch.setattr(auth_handler, "DATABASE_FILE", db_file)
+
+    auth_handler.init_auth_db()
+
+    with sqlite3.connect(db_file) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    conn.close()
+    assert 'is_admin' in columns
+
+
+def test_get_all_users_raises_on_database_error(tmp_path, monkeypatch):
+    """A failed users query raises instead of looking like an empty users table."""
+    monkeypatch.setattr(auth_handler, "DATABASE_FILE", str(tmp_path / "users.db"))
+    auth_handler.init_auth_db()
+    with sqlite3.connect(auth_handler.DATABASE_FILE) as conn:
+        conn.execute("DROP TABLE users")
+    conn.close()
+
+    with pytest.raises(sqlite3.Error):
+        auth_handler.get_all_users()
+    assert not database._db_lock.locked()
+
+
+def test_reimport_skips_users_table_setup(monkeypatch):
+    """A fresh re-import (as Streamlit's watcher does) doesn't re-run the import-time schema setup."""
+    init_calls = []
+    monkeypatch.setattr(database, "acquire_connection", lambda *args, **kwargs: init_calls.append(args))
+    monkeypatch.delitem(sys.modules, "auth_handler")
+
+    importlib.import_module("auth_handler")
+
+    assert init_calls == []
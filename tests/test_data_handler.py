@@ -0,0 +1,233 @@
+# tests/test_data_handler.py
+import io
+import os
+import sqlite3
+import pandas as pd
+import pytest
+
+import data_handler
+import database
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Points data_handler at a fresh, initialized database file for each test."""
+    db_file = str(tmp_path / "trades.db")
+    monkeypatch.setattr(data_handler, "DATABASE_FILE", db_file)
+    data_handler.init_db()
+    return db_file
+
+
+def test_load_data_fixes_dtypes(temp_db):
+    """load_data returns typed columns so callers don't need to re-clean them."""
+    assert data_handler.log_trade('user1', 'GME', 'Buy', 10, 1.25)
+    assert data_handler.log_trade('user1', 'GME', 'Sell', 4, 1.50)
+
+    df = data_handler.load_data()
+
+    assert len(df) == 2
+    assert df['id'].dtype == 'int32'
+    assert isinstance(df['action'].dtype, pd.StringDtype)
+    assert df['action'].tolist() == ['Buy', 'Sell']
+    assert df['shares'].dtype == 'float64'
+    assert df['price'].dtype == 'float64'
+    assert isinstance(df['ticker'].dtype, pd.StringDtype)
+    assert pd.api.types.is_datetime64_any_dtype(df['timestamp'])
+
+
+def test_bulk_delete_trades(temp_db):
+    """bulk_delete_trades removes only the requested IDs and reports how many were deleted."""
+    for price in (1.0, 2.0, 3.0):
+        assert data_handler.log_trade('user1', 'AMC', 'Buy', 1, price)
+    ids = data_handler.load_data()['id'].tolist()
+
+    assert data_handler.bulk_delete_trades(ids[:2] + [9999]) == 2
+    assert data_handler.load_data()['id'].tolist() == ids[2:]
+    assert data_handler.bulk_delete_trades([]) == 0
+
+
+def test_init_db_creates_trade_indexes(temp_db):
+    """init_db adds the indexes used for ordered loads and position lookups."""
+    with sqlite3.connect(temp_db) as conn:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'trades'").fetchall()
+    assert {'idx_trades_ts', 'idx_trades_participant_ticker'} <= {name for (name,) in rows}
+
+
+def test_process_and_save_csv_imports_valid_rows(temp_db):
+    """Valid CSV rows are inserted in one batch; invalid actions and non-positive amounts are dropped."""
+    csv = io.StringIO(
+        "Timestamp,Ticker,Action,Shares,Price\n"
+        "2024-05-01 10:00:00,GME,buy,10,1.25\n"
+        "2024-05-02 11:30:00,GME, Sell ,4,1.50\n"
+        "2024-05-03 09:00:00,AMC,hold,1,1.00\n"
+        "2024-05-04 09:00:00,AMC,Buy,0,1.00\n"
+    )
+
+    success, message = data_handler.process_and_save_csv(csv, 'user1')
+
+    assert success, message
+    df = data_handler.load_data()
+    assert df['action'].tolist() == ['Buy', 'Sell']
+    assert df['participant'].tolist() == ['user1', 'user1']
+    assert df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist() == ['2024-05-01 10:00:00', '2024-05-02 11:30:00']
+
+
+def test_init_db_enables_wal(temp_db):
+    """init_db switches the database file to WAL journaling."""
+    with sqlite3.connect(temp_db) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    conn.close()
+
+
+def test_failed_import_is_rolled_back(temp_db):
+    """A batch with one bad row saves nothing and leaves the shared connection usable."""
+    trades = pd.DataFrame({
+        'participant': ['user1', 'user1'],
+        'timestamp': pd.to_datetime(['2024-05-01 10:00:00', '2024-05-02 10:00:00']),
+        'ticker': ['GME', None],
+        'action': ['Buy', 'Buy'],
+        'shares': [1.0, 2.0],
+        'price': [1.0, 1.0],
+    })
+
+    assert data_handler.save_trade(trades) is False
+    assert not database._connection.in_transaction
+    assert data_handler.load_data().empty
+    assert data_handler.log_trade('user1', 'GME', 'Buy', 1, 1.0)
+
+
+def test_load_data_across_chunks(temp_db, monkeypatch):
+    """Chunked reads return the same ordered, typed frame as a single read."""
+    monkeypatch.setattr(data_handler, "LOAD_CHUNK_SIZE", 2)
+    for shares in (1, 2, 3, 4, 5):
+        assert data_handler.log_trade('user1', 'GME', 'Buy', shares, 1.0)
+
+    df = data_handler.load_data()
+
+    assert df['shares'].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert df.index.tolist() == list(range(5))
+    assert isinstance(df['action'].dtype, pd.StringDtype)
+    assert pd.api.types.is_datetime64_any_dtype(df['timestamp'])
+
+
+def test_csv_import_falls_back_for_other_timestamp_formats(temp_db):
+    """Rows not in the stored timestamp format are still parsed by the inference fallback."""
+    csv = io.StringIO(
+        "timestamp,ticker,action,shares,price\n"
+        "2024-05-01 10:00:00,GME,Buy,10,1.25\n"
+        "05/02/2024 11:30,GME,Sell,4,1.50\n"
+        "not a date,AMC,Buy,1,1.00\n"
+    )
+
+    success, message = data_handler.process_and_save_csv(csv, 'user1')
+
+    assert success, message
+    df = data_handler.load_data()
+    assert df['timestamp'].dt.strftime(data_handler.TIMESTAMP_FORMAT).tolist() == ['2024-05-01 10:00:00', '2024-05-02 11:30:00']
+
+
+def test_csv_import_normalizes_utc_suffixed_timestamps(temp_db):
+    """ISO timestamps with a Z suffix or an offset are stored as naive UTC."""
+    csv = io.StringIO(
+        "timestamp,ticker,action,shares,price\n"
+        "2024-05-01T10:00:00Z,GME,Buy,10,1.25\n"
+        "2024-05-01T14:00:00+02:00,GME,Sell,4,1.50\n"
+    )
+
+    success, message = data_handler.process_and_save_csv(csv, 'user1')
+
+    assert success, message
+    df = data_handler.load_data()
+    assert df['timestamp'].dt.strftime(data_handler.TIMESTAMP_FORMAT).tolist() == ['2024-05-01 10:00:00', '2024-05-01 12:00:00']
+
+
+def test_csv_import_accepts_fractional_second_timestamps(temp_db):
+    """Sub-second timestamps are imported, truncated to the stored whole-second format."""
+    csv = io.StringIO(
+        "timestamp,ticker,action,shares,price\n"
+        "2024-05-01 09:00:00,GME,Buy,10,1.25\n"
+        "2024-05-01 10:00:00.5,GME,Sell,4,1.50\n"
+    )
+
+    success, message = data_handler.process_and_save_csv(csv, 'user1')
+
+    assert success, message
+    df = data_handler.load_data()
+    assert df['timestamp'].dt.strftime(data_handler.TIMESTAMP_FORMAT).tolist() == ['2024-05-01 09:00:00', '2024-05-01 10:00:00']
+
+
+def test_save_trade_stores_missing_timestamps_as_null(temp_db):
+    """save_trade writes the fixed timestamp format and NULL for missing timestamps."""
+    trades = pd.DataFrame({
+        'participant': ['user1', 'user1'],
+        'timestamp': pd.to_datetime(['2024-05-01 10:00:00', None]),
+        'ticker': ['GME', 'AMC'],
+        'action': ['Buy', 'Buy'],
+        'shares': [1.0, 2.0],
+        'price': [1.0, 1.0],
+    })
+
+    assert data_handler.save_trade(trades)
+    with sqlite3.connect(temp_db) as conn:
+        rows = conn.execute("SELECT timestamp FROM trades ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [('2024-05-01 10:00:00',), (None,)]
+
+
+def test_close_connection_checkpoints_wal(temp_db):
+    """The exit hook folds the WAL into the database file, and later calls reopen the connection."""
+    assert data_handler.log_trade('user1', 'GME', 'Buy', 1, 1.0)
+
+    database.close_connection()
+
+    assert database._connection is None
+    wal_file = temp_db + "-wal"
+    assert not os.path.exists(wal_file) or os.path.getsize(wal_file) == 0
+    assert len(data_handler.load_data()) == 1
+
+
+def test_csv_import_rejects_rows_with_missing_or_bad_values(temp_db):
+    """Rows with blank fields or values that fail conversion are dropped; a file with none left is rejected."""
+    csv = io.StringIO(
+        "timestamp,ticker,action,shares,price\n"
+        "2024-05-01 10:00:00,GME,Buy,ten,1.25\n"
+        "2024-05-01 10:00:00,,Buy,1,1.25\n"
+        "2024-05-01 10:00:00,AMC,Buy,1,\n"
+    )
+
+    success, message = data_handler.process_and_save_csv(csv, 'user1')
+
+    assert not success
+    assert message == "No valid trade data remaining after validation."
+    assert data_handler.load_data().empty
+
+
+def test_load_data_keeps_unexpected_actions(temp_db):
+    """Actions written outside log_trade are loaded as stored rather than silently becoming NaN."""
+    with sqlite3.connect(temp_db) as conn:
+        conn.execute("INSERT INTO trades (participant, timestamp, ticker, action, shares, price) "
+                     "VALUES ('user1', '2024-05-01 10:00:00', 'GME', 'buy', 1, 1.0)")
+    conn.close()
+
+    assert data_handler.load_data()['action'].tolist() == ['buy']
+
+
+def test_get_shares_held_replays_position(temp_db):
+    """get_shares_held nets buys and sells for one ticker and ignores a sell larger than the position."""
+    assert data_handler.log_trade('user1', 'GME', 'Buy', 10, 1.0)
+    assert data_handler.log_trade('user1', 'GME', 'Sell', 25, 1.0)
+    assert data_handler.log_trade('user1', 'GME', 'Sell', 4, 1.0)
+    assert data_handler.log_trade('user1', 'AMC', 'Buy', 7, 1.0)
+    assert data_handler.log_trade('user2', 'GME', 'Buy', 3, 1.0)
+
+    assert data_handler.get_shares_held('user1', 'GME') == 6
+    assert data_handler.get_shares_held('user1', 'BB') == 0
+
+
+def test_load_data_raises_on_database_error(temp_db, monkeypatch):
+    """A failed read raises instead of returning an empty frame that callers would cache as 'no trades'."""
+    monkeypatch.setattr(data_handler, "LOAD_DTYPES", {'no_such_column': 'int32'})
+
+    with pytest.raises(KeyError):
+        data_handler.load_data()
+    assert not database._db_lock.locked()
@@ -108,6 +108,22 @@ def test_buy_sell_profit(mock_get_price):
     # Check value history (initial + buy + sell)
     assert len(user_portfolio['value_history']) == 3
 
+@mock.patch('portfolio.get_historical_prices', return_value=pd.DataFrame())
+@mock.patch('portfolio.get_current_price')
+def test_price_map_skips_live_lookup(mock_get_price, mock_hist):
+    """Tickers present in price_map are not looked up again."""
+    trades = pd.DataFrame([{
+        'participant': 'user1',
+        'timestamp': datetime(2024, 5, 1, 10, 0, 0),
+        'ticker': 'GME', 'action': 'Buy', 'shares': 10, 'price': 12.00
+    }])
+    trades['timestamp'] = pd.to_datetime(trades['timestamp'])
+
+    portfolio_results = calculate_portfolio(trades.copy(), {'GME': 15.00})
+
+    mock_get_price.assert_not_called()
+    assert portfolio_results['user1']['total_value'] == approx(500.0 - 120.0 + 150.0)
+
 
 # --- Add more test cases ---
 # - Test selling all shares
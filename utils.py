@@ -2,8 +2,35 @@
 import yfinance as yf
 import streamlit as st
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
-@st.cache_data(ttl=300) # Cache prices for 5 minutes
+MAX_FALLBACK_WORKERS = 8
+
+def _fetch_info_price(ticker):
+    """Looks up a single ticker's price via .info; returns None if nothing usable is found."""
+    try:
+        # Use the .info method which is good for single tickers
+        info = yf.Ticker(ticker).info
+        # Try a list of common keys where the price might be found
+        price_keys = ['currentPrice', 'regularMarketPrice', 'open', 'previousClose']
+        for key in price_keys:
+            if info.get(key) is not None:
+                return info[key]
+    except Exception:
+        # If this also fails, the ticker is likely invalid or delisted
+        pass
+    return None
+
+@st.cache_data(ttl=3600, show_spinner=False) # Ticker validity is user-independent, so cache it process-wide
+def validate_ticker(ticker):
+    """
+    Returns True if Yahoo Finance recognises the ticker symbol.
+    Lookup errors propagate instead of returning False, so a transient outage is never cached as an invalid ticker.
+    """
+    info = yf.Ticker(ticker).info
+    return bool(isinstance(info, dict) and info.get('symbol'))
+
+@st.cache_data(ttl=300, show_spinner=False) # Cache prices for 5 minutes
 def get_current_price(tickers):
     """
     Fetches the last known price for a list of tickers using multiple methods
@@ -41,19 +68,10 @@ def get_current_price(tickers):
     
     if failed_tickers:
         print(f"Batch price fetch failed for: {', '.join(failed_tickers)}. Trying individual fallback.")
-        for ticker in failed_tickers:
-            try:
-                # Use the .info method which is good for single tickers
-                info = yf.Ticker(ticker).info
-                # Try a list of common keys where the price might be found
-                price_keys = ['currentPrice', 'regularMarketPrice', 'open', 'previousClose']
-                for key in price_keys:
-                    if info.get(key) is not None:
-                        prices[ticker] = info[key]
-                        break # Stop once a valid price is found
-            except Exception:
-                # If this also fails, the ticker is likely invalid or delisted
-                prices[ticker] = None
+        # Overlap the per-ticker round-trips instead of issuing them one after another
+        with ThreadPoolExecutor(max_workers=min(MAX_FALLBACK_WORKERS, len(failed_tickers))) as executor:
+            for ticker, price in zip(failed_tickers, executor.map(_fetch_info_price, failed_tickers)):
+                prices[ticker] = price
 
     # Final check for any remaining failures
     final_failed = [t for t, p in prices.items() if p is None]